@@ -12,19 +12,40 @@ Examples:
 """
 
 import argparse
+import json
 import os
 import sys
 import subprocess
 import socket
 import re
 import secrets
+import shutil
 import string
 import tempfile
+import time
+import warnings
 import yaml
 from pathlib import Path
 from datetime import datetime
 from typing import Optional, Tuple
-from jinja2 import Template
+
+# Precompiled patterns for size parsing and VM ID extraction
+_MEM_RE = re.compile(r'^(\d+)([GgMm]?)$')
+_DISK_RE = re.compile(r'^(\d+)([GgTt]?)$')
+_VMID_RES = tuple(re.compile(p) for p in (
+    r'"vm_id":\s*["\']?(\d+)["\']?',  # JSON-style output
+    r'VM ID:\s*(\d+)',                # Display message
+    r'"ansible_facts":\s*{\s*"vm_id":\s*["\']?(\d+)["\']?'  # Ansible facts
+))
+
+# In-process DNS cache so repeated lookups within a run skip the resolver.
+# Failed lookups are cached for a shorter window than successful ones.
+_DNS_CACHE: dict = {}  # hostname -> (monotonic timestamp, ip or None)
+_DNS_TTL_OK = 900   # seconds
+_DNS_TTL_FAIL = 30  # seconds
+
+# Alphabet for SHA-512 crypt salts
+_SALT_CHARS = string.ascii_letters + string.digits + "./"
 
 
 class VMManager:
@@ -218,7 +239,7 @@ Network Configuration:
 
     def convert_memory_to_mb(self, mem_str: str) -> int:
         """Convert memory string to megabytes."""
-        match = re.match(r'^(\d+)([GgMm]?)$', mem_str)
+        match = _MEM_RE.match(mem_str)
         if not match:
             print(f"Error: Invalid memory format '{mem_str}'. Use format like '4G' or '2048M'.")
             sys.exit(1)
@@ -236,7 +257,7 @@ Network Configuration:
 
     def convert_disk_to_gb(self, disk_str: str) -> int:
         """Convert disk string to gigabytes."""
-        match = re.match(r'^(\d+)([GgTt]?)$', disk_str)
+        match = _DISK_RE.match(disk_str)
         if not match:
             print(f"Error: Invalid disk format '{disk_str}'. Use format like '100G' or '2T'.")
             sys.exit(1)
@@ -254,14 +275,39 @@ Network Configuration:
 
     def resolve_hostname(self, hostname: str) -> Optional[str]:
         """Try to resolve hostname to IP address. Returns IP if successful, None if not."""
+        now = time.monotonic()
+        entry = _DNS_CACHE.get(hostname)
+        if entry is not None:
+            timestamp, ip = entry
+            ttl = _DNS_TTL_FAIL if ip is None else _DNS_TTL_OK
+            if now - timestamp < ttl:
+                return ip
+
         try:
             ip = socket.gethostbyname(hostname)
-            return ip
         except socket.gaierror:
-            return None
+            ip = None
+
+        _DNS_CACHE[hostname] = (now, ip)
+        return ip
 
     def hash_password(self, password: str) -> str:
         """Generate password hash for preseed configuration."""
+        # Prefer in-process crypt (SHA-512) - same result as mkpasswd/openssl
+        # without forking a child process. crypt was removed in Python 3.13,
+        # so fall back to the external tools if it is unavailable; on 3.11/
+        # 3.12 the import emits a DeprecationWarning we deliberately accept.
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", DeprecationWarning)
+                import crypt
+            salt = ''.join(secrets.choice(_SALT_CHARS) for _ in range(16))
+            hashed = crypt.crypt(password, f"$6${salt}$")
+            if hashed:
+                return hashed
+        except (ImportError, AttributeError, OSError):
+            pass
+
         try:
             # Use mkpasswd if available (for yescrypt support)
             result = subprocess.run(
@@ -287,15 +333,8 @@ Network Configuration:
     def extract_vm_id_from_output(self, ansible_output: str) -> Optional[int]:
         """Extract VM ID from Ansible output."""
         # Look for patterns like 'vm_id": 245' or 'VM ID: 245'
-        import re
-        patterns = [
-            r'"vm_id":\s*["\']?(\d+)["\']?',  # JSON-style output
-            r'VM ID:\s*(\d+)',                # Display message
-            r'"ansible_facts":\s*{\s*"vm_id":\s*["\']?(\d+)["\']?'  # Ansible facts
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, ansible_output)
+        for pattern in _VMID_RES:
+            match = pattern.search(ansible_output)
             if match:
                 try:
                     return int(match.group(1))
@@ -308,8 +347,7 @@ Network Configuration:
         """Store console credentials as JSON in keyring and set up secret name for display."""
         try:
             import keyring
-            import json
-            
+
             # Generate a unique secret name based on VM info
             if self.hostname:
                 secret_name = f"vm-console-{self.hostname.split('.')[0]}"
@@ -342,8 +380,7 @@ Network Configuration:
     def validate_environment(self):
         """Check that all required tools and files are available."""
         # Check if ansible is installed
-        if not subprocess.run(["which", "ansible-playbook"], 
-                            capture_output=True, text=True).returncode == 0:
+        if shutil.which("ansible-playbook") is None:
             print("Error: ansible-playbook command not found")
             print("Please install Ansible first:")
             print("  brew install ansible")
@@ -355,14 +392,17 @@ Network Configuration:
             print(f"Error: SSH private key not found at {ssh_key_path}")
             sys.exit(1)
         
-        # Check required files exist in project directory
+        # Check required files exist in project directory - one directory
+        # scan instead of a stat call per file
         if self.operation_mode == "vm-creation":
             required_files = ["inventory.yml", "create-vm.yml", "vars.yml", "preseed.cfg.j2", "ansible.cfg"]
-            for file in required_files:
-                file_path = Path(self.project_dir) / file
-                if not file_path.exists():
+            with os.scandir(self.project_dir) as entries:
+                present = {entry.name for entry in entries}
+            missing = [file for file in required_files if file not in present]
+            if missing:
+                for file in missing:
                     print(f"Error: Required file '{file}' not found in '{self.project_dir}'")
-                    sys.exit(1)
+                sys.exit(1)
 
     def process_hostname(self):
         """Process hostname and determine network configuration."""
@@ -472,24 +512,30 @@ Network Configuration:
         # Generate password hash
         console_password_hash = self.hash_password(self.console_password)
         
-        # Prepare ansible command
+        # Prepare ansible command - pass all variables as a single JSON
+        # --extra-vars blob so Ansible parses them in one pass and values
+        # containing shell metacharacters (e.g. the crypt hash) survive intact
+        extra_vars = {
+            "target_host": self.target_node,
+            "vm_memory": self.memory_mb,
+            "vm_cores": self.cpu_cores,
+            "vm_disk_size": self.disk_size_gb,
+            "vm_hostname": self.vm_short_name,
+            "vm_fqdn": self.hostname or "",
+            "vm_static_ip": self.vm_ip,
+            "vm_use_static_ip": self.use_static_ip,
+            "console_password_hash": console_password_hash,
+        }
+
+        # Add VM ID if specified by user
+        if self.vm_id is not None:
+            extra_vars["user_vm_id"] = self.vm_id
+
         ansible_cmd = [
             "ansible-playbook", "create-vm.yml",
-            "--extra-vars", f"target_host={self.target_node}",
-            "--extra-vars", f"vm_memory={self.memory_mb}",
-            "--extra-vars", f"vm_cores={self.cpu_cores}",
-            "--extra-vars", f"vm_disk_size={self.disk_size_gb}",
-            "--extra-vars", f"vm_hostname={self.vm_short_name}",
-            "--extra-vars", f"vm_fqdn={self.hostname or ''}",
-            "--extra-vars", f"vm_static_ip={self.vm_ip}",
-            "--extra-vars", f"vm_use_static_ip={str(self.use_static_ip).lower()}",
-            "--extra-vars", f"console_password_hash={console_password_hash}",
+            "--extra-vars", json.dumps(extra_vars),
         ]
-        
-        # Add VM ID if specified by user
-        if self.vm_id is not None:
-            ansible_cmd.extend(["--extra-vars", f"user_vm_id={self.vm_id}"])
-        
+
         ansible_cmd.extend([
             "--limit", self.target_node,
             "-v"
@@ -498,31 +544,44 @@ Network Configuration:
         if self.dry_run:
             print("\nGenerating VM configuration preview...")
             ansible_cmd.extend(["--extra-vars", "dry_run_mode=true", "--check"])
-        else:
-            print("Running Ansible playbook...")
-        
-        # Execute ansible command and capture output
-        result = subprocess.run(ansible_cmd, capture_output=True, text=True)
-        
-        # Print Ansible output
-        print(result.stdout)
-        if result.stderr:
-            print(result.stderr)
-        
-        if self.dry_run:
+
+            # Tee Ansible output to the terminal while accumulating it so the
+            # generated VM ID can be extracted afterwards
+            process = subprocess.Popen(
+                ansible_cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True
+            )
+            output_lines = []
+            for line in process.stdout:
+                print(line, end="")
+                output_lines.append(line)
+            process.wait()
+
             # Extract VM ID from Ansible output for display
-            generated_vm_id = self.extract_vm_id_from_output(result.stdout)
+            generated_vm_id = self.extract_vm_id_from_output("".join(output_lines))
             print("\nThis is a dry run - no VM will be created.")
             print("Remove --dry-run to execute the actual deployment.")
             self.generate_config_summary(generated_vm_id)
-        elif result.returncode == 0:
-            self.print_completion_message()
         else:
-            print("Error: Ansible playbook failed")
-            sys.exit(1)
+            print("Running Ansible playbook...")
+
+            # Stream output directly to the terminal - no capture, no buffering
+            result = subprocess.run(ansible_cmd)
+
+            if result.returncode == 0:
+                self.print_completion_message()
+            else:
+                print("Error: Ansible playbook failed")
+                sys.exit(1)
 
     def generate_service_inventory(self):
         """Generate inventory.yml for service deployment from template."""
+        # Deferred import: only the service-deployment path renders templates,
+        # so the VM-creation path and --help never pay the jinja2 import cost
+        from jinja2 import Template
+
         # Files are in the service directory relative to the current working directory
         inventory_template_path = Path("inventory.yml.j2")
         inventory_output_path = Path("inventory.yml")
@@ -8,21 +8,51 @@ Watches Kubernetes services and automatically creates Avahi advertisements:
 """
 
 import os
+import re
 import sys
+import json
 import time
+import queue
+import signal
+import socket
 import logging
+import threading
 import subprocess
+import urllib3
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Optional, Set
-from kubernetes import client, config, watch
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple
+from kubernetes import client, config
 from kubernetes.client.rest import ApiException
 
 # Configuration
 AVAHI_HOSTS_FILE = Path(os.getenv("AVAHI_HOSTS_FILE", "/etc/avahi/hosts"))
 AVAHI_SERVICES_DIR = Path(os.getenv("AVAHI_SERVICES_DIR", "/etc/avahi/services"))
+AVAHI_PID_FILE = Path(os.getenv("AVAHI_PID_FILE", "/run/avahi-daemon/pid"))
 ANNOTATION_PREFIX = "avahi.local/"
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Optional server-side filtering for list/watch calls. Pre-filtering on the
+# API server avoids serializing and deserializing services this advertiser
+# would discard anyway, e.g. AVAHI_FIELD_SELECTOR="spec.type=LoadBalancer"
+# or a label contract like AVAHI_LABEL_SELECTOR="avahi.local/enabled".
+# should_advertise still applies as a secondary check.
+LABEL_SELECTOR = os.getenv("AVAHI_LABEL_SELECTOR", "")
+FIELD_SELECTOR = os.getenv("AVAHI_FIELD_SELECTOR", "")
 MANAGED_HOSTS_MARKER = "# Managed by k8s-avahi-advertiser"
+RELOAD_DEBOUNCE_SECONDS = 0.25  # quiet period before reloading avahi-daemon
+DEFAULT_SERVICE_TYPE = sys.intern("_http._tcp")
+
+# Hosts entries are handled as bytes end to end: built once per add, written
+# through the append descriptor and flushed without re-encoding
+_MARKER_B = MANAGED_HOSTS_MARKER.encode('ascii')
+_HOST_ENTRY = b'%b %b.local %b (%b/%b)\n'
+
+# Matches one whole managed hosts line: "IP hostname # marker (namespace/name)"
+_MANAGED_RE = re.compile(
+    rb'^(\S+)[ \t]+(\S+)[ \t]+' + re.escape(_MARKER_B) + rb'[^\n]*\n?',
+    re.M
+)
 
 # Configure logging
 logging.basicConfig(
@@ -31,6 +61,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Translation table mapping filename-unsafe characters to '-', built once so
+# sanitization is a single C-level translate call instead of a per-char loop.
+# The Latin-1 range is precomputed for plain dict hits; __missing__ applies
+# the same rule to code points above it so arbitrary Unicode punctuation
+# cannot leak into filenames.
+class _FilenameTable(dict):
+    def __missing__(self, code):
+        c = chr(code)
+        return code if c.isalnum() or c in '-_' else '-'
+
+
+_FILENAME_TABLE = _FilenameTable(
+    (ord(c), ord(c) if c.isalnum() or c in '-_' else '-')
+    for c in map(chr, range(256))
+)
+
+
+def _safe_name(name: str) -> str:
+    """Sanitize a service name for use in an Avahi service filename."""
+    return name.lower().translate(_FILENAME_TABLE)
+
+
+# Static XML fragments pre-encoded once; only the mutable middle is formatted
+_XML_HEAD = b"""<?xml version="1.0" standalone='no'?>
+<!DOCTYPE service-group SYSTEM "avahi-service.dtd">
+<service-group>
+  <name replace-wildcards="yes">%b</name>
+  <service>
+    <type>%b</type>
+    <port>%d</port>
+"""
+_XML_TXT_RECORD = b'    <txt-record>%b=%b</txt-record>\n'
+_XML_TAIL = b"""  </service>
+</service-group>
+"""
+
 
 class AvahiServiceFile:
     """Represents an Avahi service definition file (for mDNS-SD)."""
@@ -43,37 +109,89 @@ class AvahiServiceFile:
         self.service_type = service_type
         self.txt_records = txt_records or {}
     
-    def to_xml(self) -> str:
-        """Generate Avahi service XML for mDNS-SD (NodePort services)."""
-        txt_records_xml = ""
-        if self.txt_records:
-            txt_records_xml = "\n".join(
-                f'    <txt-record>{key}={value}</txt-record>'
-                for key, value in self.txt_records.items()
-            )
-        
+    def to_xml(self) -> bytes:
+        """Generate Avahi service XML (as bytes) for mDNS-SD (NodePort services)."""
         # For NodePort services, we don't specify host-name (uses local hostname)
-        xml = f"""<?xml version="1.0" standalone='no'?>
-<!DOCTYPE service-group SYSTEM "avahi-service.dtd">
-<service-group>
-  <name replace-wildcards="yes">{self.name}</name>
-  <service>
-    <type>{self.service_type}</type>
-    <port>{self.port}</port>
-"""
-        if txt_records_xml:
-            xml += txt_records_xml + "\n"
-        
-        xml += """  </service>
-</service-group>
-"""
-        return xml
+        parts = [_XML_HEAD % (self.name.encode(), self.service_type.encode(), self.port)]
+        for key, value in self.txt_records.items():
+            parts.append(_XML_TXT_RECORD % (key.encode(), value.encode()))
+        parts.append(_XML_TAIL)
+        return b"".join(parts)
     
     def filename(self) -> str:
         """Generate safe filename for this service."""
-        # Replace invalid characters for filenames
-        safe_name = "".join(c if c.isalnum() or c in "-_" else "-" for c in self.name.lower())
-        return f"k8s-{safe_name}.service"
+        return f"k8s-{_safe_name(self.name)}.service"
+
+
+class _WatchExpired(Exception):
+    """Server reported an expired watch (HTTP 410) inside the event stream."""
+
+
+def _service_view(obj: dict) -> SimpleNamespace:
+    """Materialize only the fields the advertiser reads from a raw service dict."""
+    metadata = obj.get('metadata') or {}
+    spec = obj.get('spec') or {}
+    status = obj.get('status') or {}
+    return SimpleNamespace(
+        metadata=SimpleNamespace(
+            name=metadata.get('name'),
+            namespace=metadata.get('namespace'),
+            uid=metadata.get('uid'),
+            resource_version=metadata.get('resourceVersion'),
+            annotations=metadata.get('annotations'),
+        ),
+        spec=SimpleNamespace(
+            type=spec.get('type'),
+            ports=[SimpleNamespace(node_port=p.get('nodePort'))
+                   for p in spec.get('ports') or []],
+        ),
+        status=SimpleNamespace(
+            load_balancer=SimpleNamespace(
+                ingress=[SimpleNamespace(ip=i.get('ip'))
+                         for i in (status.get('loadBalancer') or {}).get('ingress') or []],
+            ),
+        ),
+    )
+
+
+@dataclass(slots=True)
+class AvahiAnnotations:
+    """Avahi-related service annotations, parsed once per object version."""
+    name: Optional[str] = None
+    service_type: str = DEFAULT_SERVICE_TYPE
+    enabled: bool = True
+    txt: Dict[str, str] = field(default_factory=dict)
+
+
+def _parse_annotations(annotations: Optional[Dict[str, str]]) -> AvahiAnnotations:
+    """Single-pass parse of avahi.local/ annotations into typed fields."""
+    parsed = AvahiAnnotations()
+    if not annotations:
+        return parsed
+
+    for key, value in annotations.items():
+        if not key.startswith(ANNOTATION_PREFIX):
+            continue
+        short_key = key[len(ANNOTATION_PREFIX):]
+        if short_key == "name":
+            parsed.name = value
+        elif short_key == "service-type":
+            parsed.service_type = sys.intern(value)
+        elif short_key == "enabled":
+            parsed.enabled = value.lower() != "false"
+        elif short_key.startswith("txt-"):
+            parsed.txt[short_key[4:]] = value
+    return parsed
+
+
+@dataclass
+class DerivedState:
+    """Per-service values derived from metadata, cached across watch events."""
+    annotations: AvahiAnnotations
+    service_key: str     # "namespace/name"
+    hostname: str        # advertised name (annotation override or service name)
+    hostname_fqdn: str   # "<hostname>.local"
+    filename: str        # Avahi service filename
 
 
 class KubernetesAvahiAdvertiser:
@@ -83,8 +201,26 @@ class KubernetesAvahiAdvertiser:
         self.services_dir = AVAHI_SERVICES_DIR
         self.hosts_file = AVAHI_HOSTS_FILE
         self.managed_files = set()
-        self.managed_hosts: Set[str] = set()
         self.needs_reload = False
+        # In-memory model of the hosts file: events mutate these and the file
+        # is flushed once per batch instead of rewritten per event
+        self._hosts_model: Dict[str, bytes] = {}  # hostname_fqdn -> managed line
+        self._unmanaged_lines: list = []          # lines we don't own, kept verbatim
+        self._dirty_hosts = False
+        # Derived-state cache: uid -> (resource_version, DerivedState), so
+        # MODIFIED churn for an unchanged object skips re-parsing annotations
+        self._derived: Dict[str, Tuple[str, DerivedState]] = {}
+        # State each advertisement was actually created with, keyed by uid:
+        # removals use this so a renamed annotation cannot leak old files
+        self._uid_to_state: Dict[str, DerivedState] = {}
+        # Last resourceVersion seen, used to resume the watch without a relist
+        self._last_rv: Optional[str] = None
+        # Service-file writes collected during a batch of events and applied
+        # in one pass right before the coalesced avahi-daemon reload
+        self._pending_writes: Dict[str, bytes] = {}  # filename -> xml bytes
+        # Persistent append descriptor: a brand-new host entry is a single
+        # write(2); full rewrites only happen on replace/remove
+        self._hosts_fd: Optional[int] = None
         # Track hostname/service name to namespace/service mappings for conflict detection
         self.hostname_map: Dict[str, str] = {}  # hostname -> "namespace/service"
         self.service_name_map: Dict[str, str] = {}  # service_filename -> "namespace/service"
@@ -101,8 +237,25 @@ class KubernetesAvahiAdvertiser:
                 logger.error("Could not load Kubernetes configuration")
                 sys.exit(1)
         
-        self.v1 = client.CoreV1Api()
-        
+        # One shared ApiClient so lists, watches and reconnects reuse the
+        # same pooled TLS connection instead of paying a fresh handshake;
+        # TCP keepalive stops idle watch streams dying silently behind NATs
+        configuration = client.Configuration.get_default_copy()
+        configuration.connection_pool_maxsize = 4
+        api_client = client.ApiClient(configuration)
+        api_client.rest_client.pool_manager.connection_pool_kw['socket_options'] = (
+            urllib3.connection.HTTPConnection.default_socket_options
+            + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        )
+        self.v1 = client.CoreV1Api(api_client)
+
+        # Selector kwargs shared by every list/watch call
+        self._list_kwargs = {}
+        if LABEL_SELECTOR:
+            self._list_kwargs["label_selector"] = LABEL_SELECTOR
+        if FIELD_SELECTOR:
+            self._list_kwargs["field_selector"] = FIELD_SELECTOR
+
         # Ensure Avahi hosts file exists and is writable
         if not self.hosts_file.exists():
             logger.warning(f"Avahi hosts file does not exist, will create: {self.hosts_file}")
@@ -130,12 +283,96 @@ class KubernetesAvahiAdvertiser:
         
         # Load existing managed hosts
         self._load_managed_hosts()
+        self._reopen_hosts_fd()
+
+    def __del__(self):
+        if getattr(self, '_hosts_fd', None) is not None:
+            try:
+                os.close(self._hosts_fd)
+            except OSError:
+                pass
+
+    def _reopen_hosts_fd(self):
+        """(Re)open the persistent append descriptor for pure-add writes."""
+        if self._hosts_fd is not None:
+            try:
+                os.close(self._hosts_fd)
+            except OSError:
+                pass
+        try:
+            self._hosts_fd = os.open(self.hosts_file,
+                                     os.O_WRONLY | os.O_APPEND | os.O_CLOEXEC)
+        except OSError as e:
+            logger.warning(f"Could not open hosts file for appends: {e}")
+            self._hosts_fd = None
+
+    @property
+    def managed_hosts(self):
+        """Hostnames currently managed, derived from the hosts model."""
+        return self._hosts_model.keys()
     
+    def _atomic_write(self, filepath: Path, data: bytes):
+        """Publish file contents atomically (tmp in same dir + rename)."""
+        tmp_path = filepath.with_suffix(filepath.suffix + '.tmp')
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, filepath)
+
+    def _flush_hosts(self):
+        """Write the in-memory hosts model to disk atomically (tmp + rename)."""
+        if not self._dirty_hosts:
+            return
+
+        tmp_path = self.hosts_file.with_suffix('.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                for line in self._unmanaged_lines:
+                    f.write(line if line.endswith(b'\n') else line + b'\n')
+                for entry in self._hosts_model.values():
+                    f.write(entry)
+            os.replace(tmp_path, self.hosts_file)
+            self._dirty_hosts = False
+            # The rename left the append descriptor on the old inode
+            self._reopen_hosts_fd()
+        except Exception as e:
+            logger.error(f"Failed to write hosts file: {e}")
+
+    def _flush_fs_batch(self):
+        """Apply all pending service-file writes in one pass."""
+        if not self._pending_writes:
+            return
+
+        for filename, data in self._pending_writes.items():
+            try:
+                self._atomic_write(self.services_dir / filename, data)
+            except Exception as e:
+                logger.error(f"Failed to write Avahi service file {filename}: {e}")
+        self._pending_writes.clear()
+
     def reload_avahi_daemon(self):
         """Reload avahi-daemon to pick up configuration changes."""
+        # Flush any pending file changes before the daemon re-reads them
+        self._flush_fs_batch()
+        self._flush_hosts()
+
         if not self.needs_reload:
             return
-        
+
+        # Signal the daemon directly when possible: avahi's reload is just a
+        # SIGHUP (which is all 'systemctl reload avahi-daemon' dispatches),
+        # and os.kill avoids forking systemctl once per batch
+        try:
+            pid = int(AVAHI_PID_FILE.read_text().strip())
+            os.kill(pid, signal.SIGHUP)
+            logger.info("Successfully reloaded avahi-daemon (SIGHUP)")
+            self.needs_reload = False
+            return
+        except (OSError, ValueError):
+            pass  # no pidfile or stale pid - fall back to systemctl
+
         try:
             result = subprocess.run(
                 ["systemctl", "reload", "avahi-daemon"],
@@ -155,30 +392,50 @@ class KubernetesAvahiAdvertiser:
         except Exception as e:
             logger.error(f"Error reloading avahi-daemon: {e}")
     
-    def get_service_annotations(self, service) -> Dict[str, str]:
-        """Extract avahi-related annotations from service."""
-        annotations = {}
-        if service.metadata.annotations:
-            for key, value in service.metadata.annotations.items():
-                if key.startswith(ANNOTATION_PREFIX):
-                    short_key = key[len(ANNOTATION_PREFIX):]
-                    annotations[short_key] = value
-        return annotations
+    def _derive_state(self, k8s_service) -> DerivedState:
+        """Compute (or fetch cached) derived values for a service."""
+        uid = k8s_service.metadata.uid
+        resource_version = k8s_service.metadata.resource_version
+
+        cached = self._derived.get(uid)
+        if cached is not None and cached[0] == resource_version:
+            return cached[1]
+
+        name = k8s_service.metadata.name
+        namespace = k8s_service.metadata.namespace
+        annotations = _parse_annotations(k8s_service.metadata.annotations)
+        hostname = annotations.name or name
+
+        # Interned so the thousands of MODIFIED events a busy service sees
+        # share one composed-key string and dict lookups hit the identity
+        # fast path
+        state = DerivedState(
+            annotations=annotations,
+            service_key=sys.intern(f"{namespace}/{name}"),
+            hostname=hostname,
+            hostname_fqdn=sys.intern(f"{hostname}.local"),
+            filename=sys.intern(f"k8s-{_safe_name(hostname)}.service"),
+        )
+        if uid is not None:
+            self._derived[uid] = (resource_version, state)
+        return state
     
     def _load_managed_hosts(self):
-        """Load existing managed host entries from hosts file."""
+        """Load managed host entries and unmanaged lines from hosts file."""
         if not self.hosts_file.exists():
             return
-        
+
         try:
-            with open(self.hosts_file, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if MANAGED_HOSTS_MARKER in line:
-                        # Extract hostname from comment
-                        parts = line.split()
-                        if len(parts) >= 3:  # IP hostname # marker
-                            self.managed_hosts.add(parts[1])
+            data = self.hosts_file.read_bytes()
+
+            # One C-level regex scan pulls out every managed line
+            for match in _MANAGED_RE.finditer(data):
+                hostname_fqdn = match.group(2).decode()
+                entry = match.group(0)
+                self._hosts_model[hostname_fqdn] = entry if entry.endswith(b'\n') else entry + b'\n'
+
+            # Everything else is preserved verbatim
+            self._unmanaged_lines = _MANAGED_RE.sub(b'', data).splitlines(keepends=True)
         except Exception as e:
             logger.warning(f"Failed to load existing managed hosts: {e}")
     
@@ -193,11 +450,13 @@ class KubernetesAvahiAdvertiser:
             if not service.status.load_balancer.ingress:
                 return False
         
-        # Check if explicitly disabled
-        if service.metadata.annotations:
-            if service.metadata.annotations.get(f"{ANNOTATION_PREFIX}enabled", "true").lower() == "false":
-                return False
-        
+        # Check if explicitly disabled. Goes through the derived-state cache:
+        # only LoadBalancer/NodePort services reach this point, and their
+        # cached entries are evicted when they are deleted, so caching here
+        # stays bounded by the live service count.
+        if not self._derive_state(service).annotations.enabled:
+            return False
+
         return True
     
     def create_host_record(self, k8s_service):
@@ -211,14 +470,25 @@ class KubernetesAvahiAdvertiser:
             return
         
         ip = k8s_service.status.load_balancer.ingress[0].ip
-        
-        # Get hostname from annotation or use service name
-        annotations = self.get_service_annotations(k8s_service)
-        hostname = annotations.get("name", name)
-        hostname_fqdn = f"{hostname}.local"
-        
+        if not ip:
+            # Ingress entries can carry a hostname instead of an IP; an A
+            # record needs an address, so skip until one is assigned
+            logger.warning(f"LoadBalancer service {namespace}/{name} ingress has no IP address")
+            return
+
+        # Hostname and friends come from the derived-state cache
+        state = self._derive_state(k8s_service)
+        hostname = state.hostname
+        hostname_fqdn = state.hostname_fqdn
+
+        # If the advertised name changed since creation, retire the old record
+        uid = k8s_service.metadata.uid
+        previous = self._uid_to_state.get(uid)
+        if previous is not None and previous.hostname_fqdn != hostname_fqdn:
+            self.remove_host_record(k8s_service, previous)
+
         # Check for conflicts with existing services
-        current_service_key = f"{namespace}/{name}"
+        current_service_key = state.service_key
         if hostname_fqdn in self.hostname_map:
             existing_service = self.hostname_map[hostname_fqdn]
             if existing_service != current_service_key:
@@ -229,36 +499,26 @@ class KubernetesAvahiAdvertiser:
                     f"Consider using avahi.local/name annotation to specify unique hostnames."
                 )
         
-        # Read existing hosts file
-        existing_lines = []
-        if self.hosts_file.exists():
+        # Update the in-memory model. A brand-new hostname with no rewrite
+        # pending is appended straight through the persistent descriptor;
+        # replacements fall back to the batched full rewrite
+        new_entry = _HOST_ENTRY % (ip.encode(), hostname.encode(), _MARKER_B,
+                                   namespace.encode(), name.encode())
+        is_new = hostname_fqdn not in self._hosts_model
+        self._hosts_model[hostname_fqdn] = new_entry
+
+        if is_new and not self._dirty_hosts and self._hosts_fd is not None:
             try:
-                with open(self.hosts_file, 'r') as f:
-                    existing_lines = f.readlines()
-            except Exception as e:
-                logger.error(f"Failed to read hosts file: {e}")
-                return
-        
-        # Remove any existing entry for this hostname
-        new_lines = [line for line in existing_lines 
-                     if not (MANAGED_HOSTS_MARKER in line and hostname in line)]
-        
-        # Add new entry
-        new_entry = f"{ip} {hostname}.local {MANAGED_HOSTS_MARKER} ({namespace}/{name})\n"
-        new_lines.append(new_entry)
-        
-        # Write back to hosts file
-        try:
-            with open(self.hosts_file, 'w') as f:
-                f.writelines(new_lines)
-            
-            self.managed_hosts.add(hostname_fqdn)
-            self.hostname_map[hostname_fqdn] = current_service_key
-            self.needs_reload = True
-            logger.info(f"Created Avahi A record: {hostname_fqdn} → {ip} ({namespace}/{name})")
-        
-        except Exception as e:
-            logger.error(f"Failed to write hosts file: {e}")
+                os.write(self._hosts_fd, new_entry)
+            except OSError:
+                self._dirty_hosts = True
+        else:
+            self._dirty_hosts = True
+
+        self.hostname_map[hostname_fqdn] = current_service_key
+        self._uid_to_state[uid] = state
+        self.needs_reload = True
+        logger.info(f"Created Avahi A record: {hostname_fqdn} → {ip} ({namespace}/{name})")
     
     def create_service_record(self, k8s_service):
         """Create Avahi service record for NodePort service."""
@@ -275,17 +535,20 @@ class KubernetesAvahiAdvertiser:
             logger.warning(f"NodePort service {namespace}/{name} has no nodePort assigned")
             return
         
-        # Get service type from annotation or default to HTTP
-        annotations = self.get_service_annotations(k8s_service)
-        service_type = annotations.get("service-type", "_http._tcp")
-        advertise_name = annotations.get("name", name)
-        
-        # Generate filename early for conflict checking
-        safe_name = "".join(c if c.isalnum() or c in "-_" else "-" for c in advertise_name.lower())
-        filename = f"k8s-{safe_name}.service"
-        
+        # Service type, advertised name and filename come from the cache
+        state = self._derive_state(k8s_service)
+        service_type = state.annotations.service_type
+        advertise_name = state.hostname
+        filename = state.filename
+
+        # If the advertised name changed since creation, retire the old file
+        uid = k8s_service.metadata.uid
+        previous = self._uid_to_state.get(uid)
+        if previous is not None and previous.filename != filename:
+            self.remove_service_record(k8s_service, previous)
+
         # Check for conflicts with existing services
-        current_service_key = f"{namespace}/{name}"
+        current_service_key = state.service_key
         if filename in self.service_name_map:
             existing_service = self.service_name_map[filename]
             if existing_service != current_service_key:
@@ -296,35 +559,24 @@ class KubernetesAvahiAdvertiser:
                     f"Consider using avahi.local/name annotation to specify unique service names."
                 )
         
-        # Extract TXT records from annotations
-        txt_records = {}
-        for key, value in annotations.items():
-            if key.startswith("txt-"):
-                txt_key = key[4:]  # Remove "txt-" prefix
-                txt_records[txt_key] = value
-        
         # Create service file
         avahi_service = AvahiServiceFile(
             name=advertise_name,
             ip="",  # NodePort services don't need IP in service record
             port=port,
             service_type=service_type,
-            txt_records=txt_records
+            txt_records=state.annotations.txt
         )
         
-        filepath = self.services_dir / filename
-        
-        try:
-            with open(filepath, 'w') as f:
-                f.write(avahi_service.to_xml())
-            
-            self.managed_files.add(filename)
-            self.service_name_map[filename] = current_service_key
-            self.needs_reload = True
-            logger.info(f"Created Avahi service record: {filename} for {namespace}/{name} at {advertise_name}.local:{port}")
-        
-        except Exception as e:
-            logger.error(f"Failed to create Avahi service file {filename}: {e}")
+        # Queue the write; the whole batch lands atomically right before the
+        # coalesced avahi-daemon reload
+        self._pending_writes[filename] = avahi_service.to_xml()
+
+        self.managed_files.add(filename)
+        self.service_name_map[filename] = current_service_key
+        self._uid_to_state[uid] = state
+        self.needs_reload = True
+        logger.info(f"Created Avahi service record: {filename} for {namespace}/{name} at {advertise_name}.local:{port}")
     
     def create_avahi_advertisement(self, k8s_service):
         """Create appropriate Avahi advertisement based on service type."""
@@ -333,135 +585,347 @@ class KubernetesAvahiAdvertiser:
         elif k8s_service.spec.type == "NodePort":
             self.create_service_record(k8s_service)
     
-    def remove_host_record(self, k8s_service):
+    def remove_host_record(self, k8s_service, state: Optional[DerivedState] = None):
         """Remove Avahi A record for service."""
         name = k8s_service.metadata.name
         namespace = k8s_service.metadata.namespace
-        
-        annotations = self.get_service_annotations(k8s_service)
-        hostname = annotations.get("name", name)
-        hostname_fqdn = f"{hostname}.local"
-        
-        # Read existing hosts file
-        if not self.hosts_file.exists():
-            return
-        
-        try:
-            with open(self.hosts_file, 'r') as f:
-                existing_lines = f.readlines()
-            
-            # Remove entries for this hostname
-            new_lines = [line for line in existing_lines 
-                         if not (MANAGED_HOSTS_MARKER in line and hostname in line)]
-            
-            # Write back if anything changed
-            if len(new_lines) < len(existing_lines):
-                with open(self.hosts_file, 'w') as f:
-                    f.writelines(new_lines)
-                
-                self.managed_hosts.discard(hostname_fqdn)
-                # Remove from hostname map
-                current_service_key = f"{namespace}/{name}"
-                if hostname_fqdn in self.hostname_map and self.hostname_map[hostname_fqdn] == current_service_key:
-                    del self.hostname_map[hostname_fqdn]
-                self.needs_reload = True
-                logger.info(f"Removed Avahi A record: {hostname_fqdn} ({namespace}/{name})")
-        
-        except Exception as e:
-            logger.error(f"Failed to remove host record: {e}")
+
+        if state is None:
+            state = self._derive_state(k8s_service)
+        hostname_fqdn = state.hostname_fqdn
+
+        # Drop the entry from the in-memory model; flushed once per batch
+        if self._hosts_model.pop(hostname_fqdn, None) is not None:
+            self._dirty_hosts = True
+            # Remove from hostname map
+            current_service_key = state.service_key
+            if hostname_fqdn in self.hostname_map and self.hostname_map[hostname_fqdn] == current_service_key:
+                del self.hostname_map[hostname_fqdn]
+            self.needs_reload = True
+            logger.info(f"Removed Avahi A record: {hostname_fqdn} ({namespace}/{name})")
     
-    def remove_service_record(self, k8s_service):
+    def remove_service_record(self, k8s_service, state: Optional[DerivedState] = None):
         """Remove Avahi service file for Kubernetes service."""
         name = k8s_service.metadata.name
         namespace = k8s_service.metadata.namespace
-        
-        annotations = self.get_service_annotations(k8s_service)
-        advertise_name = annotations.get("name", name)
-        
-        # Generate filename
-        safe_name = "".join(c if c.isalnum() or c in "-_" else "-" for c in advertise_name.lower())
-        filename = f"k8s-{safe_name}.service"
+
+        if state is None:
+            state = self._derive_state(k8s_service)
+        filename = state.filename
         filepath = self.services_dir / filename
-        
-        if filepath.exists():
-            try:
-                filepath.unlink()
-                self.managed_files.discard(filename)
-                # Remove from service name map
-                current_service_key = f"{namespace}/{name}"
-                if filename in self.service_name_map and self.service_name_map[filename] == current_service_key:
-                    del self.service_name_map[filename]
-                self.needs_reload = True
-                logger.info(f"Removed Avahi service record: {filename} for {namespace}/{name}")
-            except Exception as e:
-                logger.error(f"Failed to remove Avahi service file {filename}: {e}")
+
+        # Drop any write still queued for this file
+        was_pending = self._pending_writes.pop(filename, None) is not None
+
+        # Unlink directly rather than stat-then-unlink; a missing file is the
+        # common 'already gone' case, not an error
+        removed = False
+        try:
+            filepath.unlink()
+            removed = True
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to remove Avahi service file {filename}: {e}")
+
+        if was_pending or removed:
+            self.managed_files.discard(filename)
+            # Remove from service name map
+            current_service_key = state.service_key
+            if filename in self.service_name_map and self.service_name_map[filename] == current_service_key:
+                del self.service_name_map[filename]
+            self.needs_reload = True
+            logger.info(f"Removed Avahi service record: {filename} for {namespace}/{name}")
     
     def remove_avahi_advertisement(self, k8s_service):
         """Remove appropriate Avahi advertisement based on service type."""
-        # Try to remove both types since we might not know which was created
+        # Prefer the state the advertisement was created with: a DELETED
+        # object may carry renamed annotations that point at the wrong files
+        uid = k8s_service.metadata.uid
+        state = self._uid_to_state.get(uid)
+
         if k8s_service.spec.type == "LoadBalancer":
-            self.remove_host_record(k8s_service)
+            self.remove_host_record(k8s_service, state)
         elif k8s_service.spec.type == "NodePort":
-            self.remove_service_record(k8s_service)
+            self.remove_service_record(k8s_service, state)
+
+        # Evict both uid-keyed caches or a long-running daemon leaks an
+        # entry for every service uid it ever saw
+        self._uid_to_state.pop(uid, None)
+        self._derived.pop(uid, None)
     
     def sync_existing_services(self):
         """Sync all existing LoadBalancer and NodePort services."""
         logger.info("Syncing existing services...")
-        
+
         try:
-            services = self.v1.list_service_for_all_namespaces()
-            
-            for service in services.items:
-                if self.should_advertise(service):
-                    self.create_avahi_advertisement(service)
-            
-            # Reload avahi-daemon if any changes were made
-            self.reload_avahi_daemon()
-        
+            services = self.v1.list_service_for_all_namespaces(**self._list_kwargs)
         except ApiException as e:
             logger.error(f"Failed to list services: {e}")
+            return
+
+        # Snapshot the managed host entries loaded from disk so a restart
+        # against an unchanged cluster ends with zero writes and no reload
+        hosts_before = dict(self._hosts_model)
+
+        for service in services.items:
+            if self.should_advertise(service):
+                self.create_avahi_advertisement(service)
+
+        # Drop queued service-file writes whose on-disk content already matches
+        unchanged = [
+            filename for filename, data in self._pending_writes.items()
+            if self._file_matches(self.services_dir / filename, data)
+        ]
+        for filename in unchanged:
+            del self._pending_writes[filename]
+
+        hosts_changed = self._hosts_model != hosts_before
+        if not hosts_changed:
+            self._dirty_hosts = False
+        if not hosts_changed and not self._pending_writes:
+            self.needs_reload = False
+
+        # Reload avahi-daemon if any changes were made
+        self.reload_avahi_daemon()
+
+        # Start the watch from where this list left off
+        self._last_rv = services.metadata.resource_version
+
+    @staticmethod
+    def _file_matches(filepath: Path, data: bytes) -> bool:
+        """Return True if the file already holds exactly the given content."""
+        try:
+            return filepath.read_bytes() == data
+        except OSError:
+            return False
+
+    def _resync(self):
+        """Relist services after a watch expiry and apply only the delta."""
+        logger.info("Resyncing services after watch expiry...")
+
+        try:
+            services = self.v1.list_service_for_all_namespaces(**self._list_kwargs)
+        except ApiException as e:
+            logger.error(f"Failed to relist services: {e}")
+            self._last_rv = None  # fall back to a fresh watch
+            return
+
+        # Snapshot state so an expiry with nothing missed ends with zero
+        # writes and no reload (same machinery as the startup sync). The
+        # flags are restored, not cleared: changes from events that landed
+        # before the expiry may still be awaiting their flush.
+        hosts_before = dict(self._hosts_model)
+        dirty_before = self._dirty_hosts
+        reload_before = self.needs_reload
+
+        # Desired state from the fresh list
+        desired_hosts: Dict[str, object] = {}  # hostname_fqdn -> service
+        desired_files: Dict[str, object] = {}  # filename -> service
+        for service in services.items:
+            if not self.should_advertise(service):
+                continue
+            state = self._derive_state(service)
+            if service.spec.type == "LoadBalancer":
+                desired_hosts[state.hostname_fqdn] = service
+            elif service.spec.type == "NodePort":
+                desired_files[state.filename] = service
+
+        # Drop advertisements whose service went away while the watch was down
+        for hostname_fqdn in set(self.hostname_map) - set(desired_hosts):
+            self._hosts_model.pop(hostname_fqdn, None)
+            del self.hostname_map[hostname_fqdn]
+            self._dirty_hosts = True
+            self.needs_reload = True
+            logger.info(f"Removed stale Avahi A record: {hostname_fqdn}")
+
+        removed_files = False
+        for filename in set(self.service_name_map) - set(desired_files):
+            filepath = self.services_dir / filename
+            self._pending_writes.pop(filename, None)
+            try:
+                filepath.unlink()
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Failed to remove Avahi service file {filename}: {e}")
+            self.managed_files.discard(filename)
+            del self.service_name_map[filename]
+            removed_files = True
+            self.needs_reload = True
+            logger.info(f"Removed stale Avahi service record: {filename}")
+
+        # Services deleted during the outage never get a DELETED event, so
+        # evict their uid-keyed cache entries here or they leak for the
+        # daemon's lifetime
+        live_uids = {service.metadata.uid for service in services.items}
+        for uid in [u for u in self._uid_to_state if u not in live_uids]:
+            del self._uid_to_state[uid]
+        for uid in [u for u in self._derived if u not in live_uids]:
+            del self._derived[uid]
+
+        # (Re)apply current advertisements
+        for service in desired_hosts.values():
+            self.create_host_record(service)
+        for service in desired_files.values():
+            self.create_service_record(service)
+
+        # Drop queued service-file writes whose on-disk content already matches
+        unchanged = [
+            filename for filename, data in self._pending_writes.items()
+            if self._file_matches(self.services_dir / filename, data)
+        ]
+        for filename in unchanged:
+            del self._pending_writes[filename]
+
+        hosts_changed = self._hosts_model != hosts_before
+        if not hosts_changed:
+            self._dirty_hosts = dirty_before
+        if not hosts_changed and not removed_files and not self._pending_writes:
+            self.needs_reload = reload_before
+
+        self.reload_avahi_daemon()
+        self._last_rv = services.metadata.resource_version
     
-    def watch_services(self):
-        """Watch for service changes and update Avahi accordingly."""
-        logger.info("Starting to watch Kubernetes services...")
-        
-        w = watch.Watch()
-        
+    def _dispatch_raw_event(self, line: bytes, events: queue.Queue):
+        """Decode one raw watch line and enqueue it for the consumer."""
+        raw = json.loads(line)
+        event_type = raw.get('type')
+        obj = raw.get('object') or {}
+
+        if event_type == 'ERROR':
+            if obj.get('code') == 410:
+                raise _WatchExpired()
+            logger.error(f"Watch error event: {obj}")
+            return
+
+        events.put({'type': event_type, 'object': _service_view(obj)})
+
+    def _watch_producer(self, events: queue.Queue):
+        """Stream Kubernetes service events into the queue (runs in a thread)."""
         while True:
+            response = None
             try:
-                for event in w.stream(self.v1.list_service_for_all_namespaces, timeout_seconds=0):
-                    event_type = event['type']
-                    service = event['object']
-                    name = service.metadata.name
-                    namespace = service.metadata.namespace
-                    
-                    logger.debug(f"Event: {event_type} for {namespace}/{name}")
-                    
-                    if event_type in ['ADDED', 'MODIFIED']:
-                        if self.should_advertise(service):
-                            self.create_avahi_advertisement(service)
-                        else:
-                            # Remove if it was previously advertised
-                            self.remove_avahi_advertisement(service)
-                    
-                    elif event_type == 'DELETED':
-                        self.remove_avahi_advertisement(service)
-                    
-                    # Reload avahi-daemon if any changes were made
-                    self.reload_avahi_daemon()
-            
+                # Resume from the last seen resourceVersion so a reconnect
+                # does not replay ADDED events for every existing service
+                kwargs = dict(self._list_kwargs)
+                if self._last_rv:
+                    kwargs["resource_version"] = self._last_rv
+
+                # Raw chunked stream: each line is one watch event. Decoding
+                # the JSON ourselves and materializing only the fields this
+                # code reads skips the full OpenAPI model per event.
+                response = self.v1.list_service_for_all_namespaces(
+                    watch=True, allow_watch_bookmarks=True,
+                    _preload_content=False, **kwargs)
+
+                buffer = b""
+                for chunk in response.stream(amt=65536, decode_content=True):
+                    buffer += chunk
+                    while True:
+                        newline = buffer.find(b"\n")
+                        if newline < 0:
+                            break
+                        line = buffer[:newline]
+                        buffer = buffer[newline + 1:]
+                        if line:
+                            self._dispatch_raw_event(line, events)
+
+            except _WatchExpired:
+                # Resource version is too old: hand the consumer a resync
+                # request (relist + diff) and wait for it to finish so the
+                # next stream resumes from the fresh list's version
+                logger.warning("Watch expired, requesting resync...")
+                resync_done = threading.Event()
+                events.put({'type': 'RESYNC', 'done': resync_done})
+                resync_done.wait()
+
             except ApiException as e:
                 if e.status == 410:
-                    # Resource version is too old, restart watch
-                    logger.warning("Watch expired, restarting...")
-                    continue
+                    logger.warning("Watch expired, requesting resync...")
+                    resync_done = threading.Event()
+                    events.put({'type': 'RESYNC', 'done': resync_done})
+                    resync_done.wait()
                 else:
                     logger.error(f"API exception while watching services: {e}")
                     time.sleep(5)
-            
+
             except Exception as e:
                 logger.error(f"Unexpected error while watching services: {e}")
                 time.sleep(5)
+
+            finally:
+                if response is not None:
+                    response.release_conn()
+
+    def watch_services(self):
+        """Watch for service changes and update Avahi accordingly."""
+        logger.info("Starting to watch Kubernetes services...")
+
+        # Events arrive through a queue so reloads can be coalesced: a burst
+        # of ADDED/MODIFIED events triggers one avahi-daemon reload after a
+        # short quiet period instead of one reload per event.
+        events: queue.Queue = queue.Queue(maxsize=1000)
+        producer = threading.Thread(
+            target=self._watch_producer, args=(events,),
+            name="k8s-service-watch", daemon=True
+        )
+        producer.start()
+
+        while True:
+            try:
+                event = events.get(timeout=RELOAD_DEBOUNCE_SECONDS)
+            except queue.Empty:
+                # Quiet period - flush a single coalesced reload for every
+                # change made since the last reload (no-op when clean)
+                self.reload_avahi_daemon()
+                continue
+
+            event_type = event['type']
+
+            if event_type == 'RESYNC':
+                # Producer hit a 410; relist, apply the delta and let it
+                # resume. It stays parked until 'done' fires, so that must
+                # happen even if the resync itself fails.
+                try:
+                    self._resync()
+                except Exception as e:
+                    logger.error(f"Error during resync: {e}")
+                finally:
+                    event['done'].set()
+                continue
+
+            service = event['object']
+            self._last_rv = service.metadata.resource_version
+
+            if event_type == 'BOOKMARK':
+                # Bookmarks only advance the resume point; no object changes
+                continue
+
+            name = service.metadata.name
+            namespace = service.metadata.namespace
+
+            logger.debug(f"Event: {event_type} for {namespace}/{name}")
+
+            # One bad service must not kill the daemon: log and move on
+            try:
+                if event_type in ['ADDED', 'MODIFIED']:
+                    if self.should_advertise(service):
+                        self.create_avahi_advertisement(service)
+                    else:
+                        # Remove if it was previously advertised
+                        self.remove_avahi_advertisement(service)
+
+                elif event_type == 'DELETED':
+                    self.remove_avahi_advertisement(service)
+            except Exception as e:
+                logger.error(f"Error handling {event_type} for {namespace}/{name}: {e}")
+
+            # Flush as soon as the pending backlog drains; the quiet-period
+            # timeout alone would defer the reload indefinitely if events
+            # keep arriving just under the debounce interval
+            if events.empty():
+                self.reload_avahi_daemon()
     
     def run(self):
         """Main run loop."""